@@ -2,13 +2,12 @@ import math
 from enum import Enum
 from functools import partial
 from os import PathLike
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import vapoursynth as vs
-from rekt import rektlvls
 from vapoursynth import core
 from vsutil import depth as vsuDepth
-from vsutil import get_depth, join, scale_value, split
+from vsutil import get_depth, scale_value, split
 
 from .types.dovi import HdrMeasurement
 from .types.misc import ST2084_PEAK_LUMINANCE, Hdr10PlusHistogram, st2084_eotf, st2084_inverse_eotf
@@ -152,6 +151,9 @@ def bbmod(
     if cRight is not None:
         right = cRight
 
+    if not (top or bottom or left or right):
+        return clip
+
     if planes is not None:
         if isinstance(planes, int):
             planes = [planes]
@@ -198,179 +200,57 @@ def bbmod(
     c_top = max(top * csize, 4)
     c_bottom = max(bottom * csize, 4)
 
-    f_width, f_height = filtered.width, filtered.height
-
-    if left > 0 and right > 0:
-        left_clip = filtered.std.Crop(left=0, right=f_width - c_left, top=0, bottom=0)
-        middle_clip = filtered.std.Crop(left=c_left, right=c_right, top=0, bottom=0)
-        right_clip = filtered.std.Crop(left=f_width - c_right, right=0, top=0, bottom=0)
-
-        left_clip = bbmoda(
-            left_clip,
-            cTop=0,
-            cBottom=0,
-            cLeft=left,
-            cRight=0,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
-        right_clip = bbmoda(
-            right_clip,
-            cTop=0,
-            cBottom=0,
-            cLeft=0,
-            cRight=right,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
+    def process_edges(
+        filtered: vs.VideoNode, near: int, far: int, c_near: int, c_far: int, vertical: bool
+    ) -> vs.VideoNode:
+        # Handles one axis: near/far is left/right for horizontal, top/bottom for vertical
+        if near == 0 and far == 0:
+            return filtered
+
+        dimension = filtered.height if vertical else filtered.width
+        stack = core.std.StackVertical if vertical else core.std.StackHorizontal
+
+        def crop_strip(start: int, length: int) -> vs.VideoNode:
+            if vertical:
+                return filtered.std.Crop(left=0, right=0, top=start, bottom=dimension - start - length)
+
+            return filtered.std.Crop(left=start, right=dimension - start - length, top=0, bottom=0)
+
+        def balance(strip: vs.VideoNode, near_size: int, far_size: int) -> vs.VideoNode:
+            return bbmoda(
+                strip,
+                cTop=near_size if vertical else 0,
+                cBottom=far_size if vertical else 0,
+                cLeft=0 if vertical else near_size,
+                cRight=0 if vertical else far_size,
+                thresh=thresh,
+                blur=blur,
+                y=y,
+                u=u,
+                v=v,
+                scale_thresh=scale_thresh,
+                cpass2=cpass2,
+                csize=csize,
+                scale_offsets=scale_offsets,
+            )
 
-        filtered = core.std.StackHorizontal(clips=[left_clip, middle_clip, right_clip])
-
-    if left > 0 and right == 0:
-        left_clip = filtered.std.Crop(left=0, right=f_width - c_left, top=0, bottom=0)
-        middle_clip = filtered.std.Crop(left=c_left, right=0, top=0, bottom=0)
-
-        left_clip = bbmoda(
-            left_clip,
-            cTop=0,
-            cBottom=0,
-            cLeft=left,
-            cRight=0,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
+        middle_start = c_near if near > 0 else 0
+        middle_length = dimension - middle_start - (c_far if far > 0 else 0)
 
-        filtered = core.std.StackHorizontal(clips=[left_clip, middle_clip])
-
-    if left == 0 and right > 0:
-        right_clip = filtered.std.Crop(left=f_width - c_right, right=0, top=0, bottom=0)
-        middle_clip = filtered.std.Crop(left=0, right=c_right, top=0, bottom=0)
-
-        right_clip = bbmoda(
-            right_clip,
-            cTop=0,
-            cBottom=0,
-            cLeft=0,
-            cRight=right,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
+        strips = []
 
-        filtered = core.std.StackHorizontal(clips=[middle_clip, right_clip])
-
-    if top > 0 and bottom > 0:
-        top_clip = filtered.std.Crop(left=0, right=0, top=0, bottom=f_height - c_top)
-        middle_clip = filtered.std.Crop(left=0, right=0, top=c_top, bottom=c_bottom)
-        bottom_clip = filtered.std.Crop(left=0, right=0, top=f_height - c_bottom, bottom=0)
-
-        top_clip = bbmoda(
-            top_clip,
-            cTop=top,
-            cBottom=0,
-            cLeft=0,
-            cRight=0,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
-        bottom_clip = bbmoda(
-            bottom_clip,
-            cTop=0,
-            cBottom=bottom,
-            cLeft=0,
-            cRight=0,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
+        if near > 0:
+            strips.append(balance(crop_strip(0, c_near), near, 0))
 
-        filtered = core.std.StackVertical(clips=[top_clip, middle_clip, bottom_clip])
-
-    if top > 0 and bottom == 0:
-        top_clip = filtered.std.Crop(left=0, right=0, top=0, bottom=f_height - c_top)
-        middle_clip = filtered.std.Crop(left=0, right=0, top=c_top, bottom=0)
-
-        top_clip = bbmoda(
-            top_clip,
-            cTop=top,
-            cBottom=0,
-            cLeft=0,
-            cRight=0,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
+        strips.append(crop_strip(middle_start, middle_length))
 
-        filtered = core.std.StackVertical(clips=[top_clip, middle_clip])
-
-    if top == 0 and bottom > 0:
-        bottom_clip = filtered.std.Crop(left=0, right=0, top=f_height - c_bottom, bottom=0)
-        middle_clip = filtered.std.Crop(left=0, right=0, top=0, bottom=c_bottom)
-
-        bottom_clip = bbmoda(
-            bottom_clip,
-            cTop=0,
-            cBottom=bottom,
-            cLeft=0,
-            cRight=0,
-            thresh=thresh,
-            blur=blur,
-            y=y,
-            u=u,
-            v=v,
-            scale_thresh=scale_thresh,
-            cpass2=cpass2,
-            csize=csize,
-            scale_offsets=scale_offsets,
-        )
+        if far > 0:
+            strips.append(balance(crop_strip(dimension - c_far, c_far), 0, far))
 
-        filtered = core.std.StackVertical(clips=[middle_clip, bottom_clip])
+        return stack(clips=strips)
+
+    filtered = process_edges(filtered, left, right, c_left, c_right, vertical=False)
+    filtered = process_edges(filtered, top, bottom, c_top, c_bottom, vertical=True)
 
     return filtered
 
@@ -425,6 +305,11 @@ def bbmoda(
     if not isinstance(c, vs.VideoNode):
         raise TypeError(funcName + ': "c" must be a clip!')
 
+    if cTop == cBottom == cLeft == cRight == 0:
+        return c
+
+    bits = c.format.bits_per_sample
+
     if isinstance(thresh, (int, float)):
         # thresh needs to be lower for chroma for cpass2
         if cpass2:
@@ -435,11 +320,11 @@ def bbmoda(
         thresh.append(thresh[1])
 
     if scale_thresh:
-        thresh[0] = scale_value(thresh[0], 8, c.format.bits_per_sample, scale_offsets=False)
+        thresh[0] = scale_value(thresh[0], 8, bits, scale_offsets=False)
         i = 1
 
         for _ in thresh[1:]:
-            thresh[i] = scale_value(thresh[i], 8, c.format.bits_per_sample, scale_offsets=False, chroma=False)
+            thresh[i] = scale_value(thresh[i], 8, bits, scale_offsets=False, chroma=False)
             i += 1
 
     if isinstance(blur, int):
@@ -459,75 +344,68 @@ def bbmoda(
         if _ <= 0 and c.format.sample_type == vs.INTEGER:
             raise ValueError(funcName + ": 'thresh' has an incorrect value! (0 ~ inf]")
 
+    # The Expr strings only depend on format and thresh, so build them once per call
+    # instead of once per processed side
+    scale128 = str(scale_value(128, 8, bits, scale_offsets=scale_offsets, chroma=True))
+    uvexpr_ = "z y - x +"
+    uvexpr = []
+
+    # clamp to x +/- thresh with min/max so the balance term is only evaluated once
+    for t in [1, 2]:
+        uvexpr.append(f"{uvexpr_} x {thresh[t]} + min x {thresh[t]} - max")
+    if c.format.sample_type == vs.INTEGER:
+        exprchroma = f"x {scale128} - abs 2 *"
+        expruv = f"z y / 8 min 0.4 max x {scale128} - * {scale128} + x - {scale128} +"
+    else:
+        exprchroma = "x abs 2 *"
+        expruv = "z .5 + y .5 + / 8 min .4 max x .5 + * x - .5 +"
+
+    scale16 = str(scale_value(16, 8, bits, scale_offsets=scale_offsets))
+
+    yexpr = f"z {scale16} - y {scale16} - / 8 min 0.4 max x {scale16} - * {scale16} +"
+    yexpr = f"{yexpr} x {thresh[0]} + min x {thresh[0]} - max"
+
     def btb(c: vs.VideoNode, cTop: int, thresh: Any, blur: Any) -> vs.VideoNode:
         cWidth = c.width
         cHeight = c.height
         sw, sh = c.format.subsampling_w + 1, c.format.subsampling_h + 1
         cTop = min(cTop, cHeight - 1)
 
+        # int() rather than floor() since blur entries may be floats
         blurWidth = [
-            max(8, math.floor(cWidth / blur[0])),
-            max(8, math.floor(cWidth / blur[1])),
-            max(8, math.floor(cWidth / blur[2])),
+            max(8, int(cWidth // blur[0])),
+            max(8, int(cWidth // blur[1])),
+            max(8, int(cWidth // blur[2])),
         ]
 
-        scale128 = str(scale_value(128, 8, c.format.bits_per_sample, scale_offsets=scale_offsets, chroma=True))
-        uvexpr_ = "z y - x +"
-        uvexpr = []
-
-        for t in [1, 2]:
-            uvexpr.append(
-                (
-                    f"{uvexpr_} x - {thresh[t]} > x {thresh[t]} + {uvexpr_} x - "
-                    f"-{thresh[t]} < x {thresh[t]} - {uvexpr_} ? ?"
-                )
-            )
-        if c.format.sample_type == vs.INTEGER:
-            exprchroma = f"x {scale128} - abs 2 *"
-            expruv = f"z y / 8 min 0.4 max x {scale128} - * {scale128} + x - {scale128} +"
-        else:
-            exprchroma = "x abs 2 *"
-            expruv = "z .5 + y .5 + / 8 min .4 max x .5 + * x - .5 +"
+        def hblur(c: vs.VideoNode, blur_width: int, width: int) -> vs.VideoNode:
+            # Horizontal low-pass equivalent to the former B-spline Bicubic
+            # downscale to blur_width and back up to width, without
+            # materializing the intermediate downscaled buffer.
+            # Three box passes approximate the gaussian-like response.
+            radius = width // (2 * blur_width)
 
-        scale16 = str(scale_value(16, 8, c.format.bits_per_sample, scale_offsets=scale_offsets))
+            if radius < 1:
+                return c
 
-        yexpr = f"z {scale16} - y {scale16} - / 8 min 0.4 max x {scale16} - * {scale16} +"
-        yexpr = f"{yexpr} x - {thresh[0]} > x {thresh[0]} + {yexpr} x - -{thresh[0]} < x {thresh[0]} - {yexpr} ? ?"
+            return c.std.BoxBlur(hradius=radius, hpasses=3, vradius=0)
 
         if y and u and v and blur[0] == blur[1] == blur[2] and thresh[0] == thresh[1] == thresh[2] and sw == sh == 1:
-            c2 = core.resize.Point(c, cWidth * csize, cHeight * csize)
-            last = core.std.CropAbs(c2, cWidth * csize, csize, 0, cTop * csize)
-            last = core.resize.Point(last, cWidth * csize, cTop * csize)
-            exprchroma = ["", exprchroma]
+            last = core.std.CropAbs(c, cWidth, 1, 0, cTop)
+            last = core.resize.Point(last, cWidth, cTop)
+            exprchroma_yuv = ["", exprchroma]
 
             if cpass2:
-                referenceBlurChroma = (
-                    last.std.Expr(exprchroma)
-                    .resize.Bicubic(blurWidth[0] * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
-                    .resize.Bicubic(cWidth * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
-                )
+                referenceBlurChroma = hblur(last.std.Expr(exprchroma_yuv), blurWidth[0], cWidth)
 
-            referenceBlur = core.resize.Bicubic(
-                last, blurWidth[0] * csize, cTop * csize, filter_param_a=1, filter_param_b=0
-            )
-            referenceBlur = referenceBlur.resize.Bicubic(
-                cWidth * csize, cTop * csize, filter_param_a=1, filter_param_b=0
-            )
+            referenceBlur = hblur(last, blurWidth[0], cWidth)
 
-            original = core.std.CropAbs(c2, cWidth * csize, cTop * csize, 0, 0)
+            original = core.std.CropAbs(c, cWidth, cTop, 0, 0)
 
-            last = core.resize.Bicubic(original, blurWidth[0] * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
-
-            originalBlur = last.resize.Bicubic(cWidth * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
+            originalBlur = hblur(original, blurWidth[0], cWidth)
 
             if cpass2:
-                originalBlurChroma = last.std.Expr(exprchroma).resize.Bicubic(
-                    blurWidth[0] * csize, cTop * csize, filter_param_a=1, filter_param_b=0
-                )
-
-                originalBlurChroma = originalBlurChroma.resize.Bicubic(
-                    cWidth * csize, cTop * csize, filter_param_a=1, filter_param_b=0
-                )
+                originalBlurChroma = hblur(original.std.Expr(exprchroma_yuv), blurWidth[0], cWidth)
 
                 balancedChroma = core.std.Expr(
                     clips=[original, originalBlurChroma, referenceBlurChroma], expr=["", expruv]
@@ -540,9 +418,7 @@ def bbmoda(
                     clips=[original, originalBlur, referenceBlur], expr=[yexpr, uvexpr[0], uvexpr[1]]
                 )
 
-            return core.std.StackVertical(
-                [balancedLuma, core.std.CropAbs(c2, cWidth * csize, (cHeight - cTop) * csize, 0, cTop * csize)]
-            ).resize.Point(cWidth, cHeight)
+            return core.std.StackVertical([balancedLuma, core.std.CropAbs(c, cWidth, cHeight - cTop, 0, cTop)])
 
         if c.format.color_family == vs.YUV:
             yplane, uplane, vplane = split(c)
@@ -551,61 +427,41 @@ def bbmoda(
         else:
             raise ValueError("bbmod: only YUV and GRAY clips are supported")
         if y:
-            c2 = core.resize.Point(yplane, cWidth * csize, cHeight * csize)
-            last = core.std.CropAbs(c2, cWidth * csize, csize, 0, cTop * csize)
-            last = core.resize.Point(last, cWidth * csize, cTop * csize)
+            last = core.std.CropAbs(yplane, cWidth, 1, 0, cTop)
+            last = core.resize.Point(last, cWidth, cTop)
 
-            referenceBlur = core.resize.Bicubic(
-                last, blurWidth[0] * csize, cTop * csize, filter_param_a=1, filter_param_b=0
-            ).resize.Bicubic(cWidth * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
+            referenceBlur = hblur(last, blurWidth[0], cWidth)
 
-            original = core.std.CropAbs(c2, cWidth * csize, cTop * csize, 0, 0)
+            original = core.std.CropAbs(yplane, cWidth, cTop, 0, 0)
 
-            last = core.resize.Bicubic(original, blurWidth[0] * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
-
-            originalBlur = last.resize.Bicubic(cWidth * csize, cTop * csize, filter_param_a=1, filter_param_b=0)
+            originalBlur = hblur(original, blurWidth[0], cWidth)
             balancedLuma = core.std.Expr(clips=[original, originalBlur, referenceBlur], expr=yexpr)
 
             yplane = core.std.StackVertical(
-                clips=[balancedLuma, core.std.CropAbs(c2, cWidth * csize, (cHeight - cTop) * csize, 0, cTop * csize)]
-            ).resize.Point(cWidth, cHeight)
+                clips=[balancedLuma, core.std.CropAbs(yplane, cWidth, cHeight - cTop, 0, cTop)]
+            )
 
             if c.format.color_family == vs.GRAY:
                 return yplane
 
-        def btbc(c2: vs.VideoNode, blurWidth: int, p: int, csize: int) -> vs.VideoNode:
-            c2 = core.resize.Point(c2, round(cWidth * csize / sw), round(cHeight * csize / sh))
-            last = core.std.CropAbs(c2, round(cWidth * csize / sw), round(csize / sh), 0, round(cTop * csize / sh))
-            last = core.resize.Point(last, round(cWidth * csize / sw), round(cTop * csize / sh))
+        def btbc(c2: vs.VideoNode, blurWidth: int, p: int) -> vs.VideoNode:
+            pw, ph = c2.width, c2.height
+            pTop = min(max(1, round(cTop / sh)), ph - 1)
+            pBlurWidth = max(1, round(blurWidth / sw))
+
+            last = core.std.CropAbs(c2, pw, 1, 0, pTop)
+            last = core.resize.Point(last, pw, pTop)
             if cpass2:
-                referenceBlurChroma = last.std.Expr(exprchroma).resize.Bicubic(
-                    round(blurWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-                )
-                referenceBlurChroma = referenceBlurChroma.resize.Bicubic(
-                    round(cWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-                )
+                referenceBlurChroma = hblur(last.std.Expr(exprchroma), pBlurWidth, pw)
 
-            referenceBlur = core.resize.Bicubic(
-                last, round(blurWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-            ).resize.Bicubic(round(cWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0)
+            referenceBlur = hblur(last, pBlurWidth, pw)
 
-            original = core.std.CropAbs(c2, round(cWidth * csize / sw), round(cTop * csize / sh), 0, 0)
+            original = core.std.CropAbs(c2, pw, pTop, 0, 0)
 
-            last = core.resize.Bicubic(
-                original, round(blurWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-            )
-
-            originalBlur = last.resize.Bicubic(
-                round(cWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-            )
+            originalBlur = hblur(original, pBlurWidth, pw)
 
             if cpass2:
-                originalBlurChroma = last.std.Expr(exprchroma).resize.Bicubic(
-                    round(blurWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-                )
-                originalBlurChroma = originalBlurChroma.resize.Bicubic(
-                    round(cWidth * csize / sw), round(cTop * csize / sh), filter_param_a=1, filter_param_b=0
-                )
+                originalBlurChroma = hblur(original.std.Expr(exprchroma), pBlurWidth, pw)
 
                 balancedChroma = core.std.Expr(clips=[original, originalBlurChroma, referenceBlurChroma], expr=expruv)
                 balancedLuma = core.std.Expr(clips=[balancedChroma, originalBlur, referenceBlur], expr=expruv)
@@ -615,46 +471,47 @@ def bbmoda(
             return core.std.StackVertical(
                 [
                     balancedLuma,
-                    c2.std.CropAbs(
-                        left=0,
-                        top=round(cTop * csize / sh),
-                        width=round(cWidth * csize / sw),
-                        height=round(cHeight * csize / sh) - round(cTop * csize / sh),
-                    ),
+                    c2.std.CropAbs(left=0, top=pTop, width=pw, height=ph - pTop),
                 ]
-            ).resize.Point(round(cWidth / sw), round(cHeight / sh))
+            )
 
         if c.format.color_family == vs.GRAY:
-            return btbc(yplane, blurWidth[1], 1, csize)
+            return btbc(yplane, blurWidth[1], 1)
 
         if u:
-            uplane = btbc(uplane, blurWidth[1], 1, csize * max(sw, sh))
+            uplane = btbc(uplane, blurWidth[1], 1)
         if v:
-            vplane = btbc(vplane, blurWidth[2], 2, csize * max(sw, sh))
+            vplane = btbc(vplane, blurWidth[2], 2)
 
         return core.std.ShufflePlanes([yplane, uplane, vplane], [0, 0, 0], vs.YUV)
 
-    if cTop > 0:
-        c = btb(c, cTop, thresh, blur).std.Transpose().std.FlipHorizontal()
-    else:
-        c = core.std.Transpose(c).std.FlipHorizontal()
+    def rotate(c: vs.VideoNode, rotations: int) -> vs.VideoNode:
+        # Transpose+FlipHorizontal is a 90 degree rotation, so deferred rotations can
+        # be collapsed into at most two passes instead of one pair per skipped side
+        rotations %= 4
 
-    if cLeft > 0:
-        c = btb(c, cLeft, thresh, blur).std.Transpose().std.FlipHorizontal()
-    else:
-        c = core.std.Transpose(c).std.FlipHorizontal()
+        if rotations == 1:
+            return c.std.Transpose().std.FlipHorizontal()
+        if rotations == 2:
+            return core.std.Turn180(c)
+        if rotations == 3:
+            return c.std.FlipHorizontal().std.Transpose()
 
-    if cBottom > 0:
-        c = btb(c, cBottom, thresh, blur).std.Transpose().std.FlipHorizontal()
-    else:
-        c = core.std.Transpose(c).std.FlipHorizontal()
+        return c
 
-    if cRight > 0:
-        c = btb(c, cRight, thresh, blur).std.Transpose().std.FlipHorizontal()
-    else:
-        c = core.std.Transpose(c).std.FlipHorizontal()
+    # Each side is processed as the current top, rotating 90 degrees in between.
+    # Rotations are only materialized when a side actually runs btb, the rest are
+    # accumulated and collapsed at the end, so zero-valued sides cost nothing.
+    pending = 0
+
+    for side in (cTop, cLeft, cBottom, cRight):
+        if side > 0:
+            c = btb(rotate(c, pending), side, thresh, blur)
+            pending = 0
+
+        pending += 1
 
-    return c
+    return rotate(c, pending)
 
 
 def AddBordersMod(
@@ -693,6 +550,11 @@ def AddBordersMod(
         else:
             rsat = 0.28
 
+    # The rektlvls calls this used collapsed the two border rows/columns to
+    # black; a constant luma Expr on the strip does the same without the
+    # per-row levels machinery
+    black = scale_value(16, 8, clip.format.bits_per_sample)
+
     if left > 0:
         if lsat != 1:
             lcl = clip.std.AddBorders(left=left, color=color)
@@ -709,43 +571,61 @@ def AddBordersMod(
         tcl = tcl.std.CropAbs(clip.width, top - 2)
         tcm = clip.std.CropAbs(clip.width, 2)
         tcm = saturation(tcm, sat=tsat)
-        tcm = rektlvls(tcm, [0, 1], [16 - 235] * 2, prot_val=None)
+        tcm = tcm.std.Expr([f"{black}", "", ""])
         clip = core.std.StackVertical([tcl, tcm, clip])
     elif top == 2:
         tcl = clip.std.CropAbs(clip.width, 2)
         tcl = saturation(tcl, sat=tsat)
-        tcl = rektlvls(tcl, [0, 1], [16 - 235] * 2, prot_val=None)
+        tcl = tcl.std.Expr([f"{black}", "", ""])
         clip = core.std.StackVertical([tcl, clip])
 
     if right > 2:
         rcm = clip.std.Crop(left=clip.width - 2)
         rcm = saturation(rcm, sat=rsat)
-        rcm = rektlvls(rcm, colnum=[0, 1], colval=[16 - 235] * 2, prot_val=None)
+        rcm = rcm.std.Expr([f"{black}", "", ""])
         rcr = clip.std.AddBorders(right=right, color=color)
         rcr = rcr.std.Crop(left=clip.width + 2)
         clip = core.std.StackHorizontal([clip, rcm, rcr])
     elif right == 2:
         rcr = clip.std.Crop(left=clip.width - 2)
         rcr = saturation(rcr, sat=rsat)
-        rcr = rektlvls(rcr, colnum=[0, 1], colval=[16 - 235] * 2, prot_val=None)
+        rcr = rcr.std.Expr([f"{black}", "", ""])
         clip = core.std.StackHorizontal([clip, rcr])
 
     if bottom > 2:
         bcm = clip.std.Crop(top=clip.height - 2)
         bcm = saturation(bcm, sat=bsat)
-        bcm = rektlvls(bcm, [0, 1], [16 - 235] * 2, prot_val=None)
+        bcm = bcm.std.Expr([f"{black}", "", ""])
         bcr = clip.std.AddBorders(bottom=bottom)
         bcr = bcr.std.Crop(top=clip.height + 2)
         clip = core.std.StackVertical([clip, bcm, bcr])
     elif bottom == 2:
         bcr = clip.std.Crop(top=clip.height - 2)
         bcr = saturation(bcr, sat=bsat)
-        bcr = rektlvls(bcr, [0, 1], [16 - 235] * 2, prot_val=None)
+        bcr = bcr.std.Expr([f"{black}", "", ""])
         clip = core.std.StackVertical([clip, bcr])
 
     return clip
 
 
+# Only names are cached; the plugin function is resolved against the current
+# core on every call, since cached Function objects go stale across script
+# reloads in vsscript hosts like VSEdit
+_RESIZER_NAMES: Dict[str, str] = {
+    "bilinear": "Bilinear",
+    "bicubic": "Bicubic",
+    "point": "Point",
+    "lanczos": "Lanczos",
+    "spline16": "Spline16",
+    "spline36": "Spline36",
+    "spline64": "Spline64",
+}
+
+
+def _get_resizer(kernel: str) -> Callable:
+    return getattr(core.resize, _RESIZER_NAMES[kernel.lower()])
+
+
 def zresize(
     clip: vs.VideoNode,
     preset: Optional[int] = None,
@@ -760,17 +640,6 @@ def zresize(
     dither_type="error_diffusion",
     **kwargs,
 ) -> vs.VideoNode:
-    # VSEdit doesn't like the global dict
-    RESIZEDICT: Dict = {
-        "bilinear": core.resize.Bilinear,
-        "bicubic": core.resize.Bicubic,
-        "point": core.resize.Point,
-        "lanczos": core.resize.Lanczos,
-        "spline16": core.resize.Spline16,
-        "spline36": core.resize.Spline36,
-        "spline64": core.resize.Spline64,
-    }
-
     orig_w = clip.width
     orig_h = clip.height
 
@@ -804,7 +673,7 @@ def zresize(
         # noop
         return clip
 
-    resizer = RESIZEDICT[kernel.lower()]
+    resizer = _get_resizer(kernel)
 
     fun = {
         "clip": clip,
@@ -821,6 +690,27 @@ def zresize(
     return resizer(**fun)
 
 
+# Parsed CSV rows keyed by (path, mtime, delimiter), so re-running a script
+# against an unchanged zone file skips the parse
+_DEBAND_CSV_CACHE: Dict[Tuple[str, float, str], List[Tuple[int, int, int]]] = {}
+
+
+def _read_deband_csv(csvfile: Union[str, PathLike], delimiter: str) -> List[Tuple[int, int, int]]:
+    import csv
+    from os.path import getmtime
+
+    key = (str(csvfile), getmtime(csvfile), delimiter)
+    rows = _DEBAND_CSV_CACHE.get(key)
+
+    if rows is None:
+        with open(csvfile) as debandcsv:
+            rows = [(int(row[0]), int(row[1]), int(row[2])) for row in csv.reader(debandcsv, delimiter=delimiter)]
+
+        _DEBAND_CSV_CACHE[key] = rows
+
+    return rows
+
+
 def DebandReader(
     clip: vs.VideoNode,
     csvfile: Union[str, PathLike],
@@ -836,16 +726,25 @@ def DebandReader(
       * grain is passed as grainy and grainc in the f3kdb filter
       * f3kdb_range is passed as range in the f3kdb filter
     """
-    import csv
+    import numpy as np
 
     depth = get_depth(clip)
     filtered = clip if depth <= 16 else Depth(clip, 16)
 
-    with open(csvfile) as debandcsv:
-        csvzones = csv.reader(debandcsv, delimiter=delimiter)
-        for row in csvzones:
-            strength = row[2]
+    db_clips: List[vs.VideoNode] = []
+    strength_zones: Dict[int, int] = {}
+    zone_map = np.full(clip.num_frames, -1, dtype=np.int32)
+
+    for start, end, strength in _read_deband_csv(csvfile, delimiter):
+        # Reject bad ranges before the slice assignment silently clamps or
+        # wraps them onto the wrong frames
+        if not 0 <= start <= end < clip.num_frames:
+            raise ValueError(f"DebandReader: invalid frame range {start}-{end} for clip of {clip.num_frames} frames")
 
+        # Zones sharing a strength share one Deband node
+        zone = strength_zones.get(strength)
+
+        if zone is None:
             db = core.f3kdb.Deband(
                 clip,
                 y=strength,
@@ -858,10 +757,29 @@ def DebandReader(
                 output_depth=depth,
             )
 
-            filtered = ReplaceFrames(filtered, db, mappings="[" + row[0] + " " + row[1] + "]")
+            zone = len(db_clips)
+            db_clips.append(db)
+            strength_zones[strength] = zone
+
+        zone_map[start : end + 1] = zone
+
+    if db_clips:
+        # Dispatch zones with a single FrameEval instead of chaining one
+        # ReplaceFrames node per CSV row, which made every frame request
+        # traverse the whole zone list.
+        # The callback must return the pre-FrameEval node, not the rebound
+        # `filtered`, or unzoned frames would request the FrameEval itself
+        base = filtered
+
+        def select_zone(n: int) -> vs.VideoNode:
+            zone = zone_map[n]
+
+            return base if zone < 0 else db_clips[zone]
 
-        if mask:
-            filtered = core.std.MaskedMerge(clip, filtered, mask)
+        filtered = core.std.FrameEval(base, select_zone)
+
+    if mask:
+        filtered = core.std.MaskedMerge(clip, filtered, mask)
 
     return filtered
 
@@ -922,6 +840,7 @@ def ScreenGen(
     or
     >>> ScreenGen([src, enc], "Screenshots") # equivalent: src is a, enc is b
     """
+    from concurrent.futures import ThreadPoolExecutor
     from pathlib import Path
 
     folder_path = Path(folder).resolve()
@@ -980,6 +899,8 @@ def ScreenGen(
 
             rgb_clip = clip.resize.Spline36(format=vs.RGB24, matrix_in_s="709", dither_type="error_diffusion")
 
+            write_jobs: List[tuple] = []
+
             for i, num in enumerate(screens, start=start):
                 if filename_callback is not None:
                     target_str = filename_callback(num, suffix)
@@ -997,6 +918,12 @@ def ScreenGen(
                 if prefix != ScreenGenPrefix.FrameNo:
                     log_str += f", frame: {num}"
 
+                write_jobs.append((num, final_path, log_str))
+
+            def write_screen(job: tuple) -> None:
+                num, final_path, log_str = job
+
+                # Logged from the worker so progress tracks actual writes
                 if callable(callback):
                     callback(log_str)
                 else:
@@ -1008,6 +935,11 @@ def ScreenGen(
                     new_path = folder_path.joinpath(f"%d{suffix}.png").resolve()
                     encoder_final.write_frame(rgb_clip, num, new_path, fpng_compression)
 
+            # Overlapping frame requests keep the decode/resize/encode pipeline
+            # busy instead of waiting on each PNG write in turn
+            with ThreadPoolExecutor(max_workers=min(len(write_jobs), 4)) as executor:
+                list(executor.map(write_screen, write_jobs))
+
     else:
         raise ValueError("ScreenGen: No screenshots to write to disk")
 
@@ -1044,13 +976,23 @@ def DynamicTonemap(
     :return: SDR YUV444P8 clip by default.
     """
 
+    # Built tonemap nodes by quantized peak, so repeated levels skip the
+    # per-frame graph construction entirely
+    tonemap_cache: Dict[float, vs.VideoNode] = {}
+
     def __dt(
         n: int,
         f: vs.VideoFrame,
         clip: vs.VideoNode,
         adjust_gamma: bool,
     ) -> vs.VideoNode:
-        peak = f.props["HDRMax"]
+        # Quantize the peak to 50 nit steps (floor of 100) so runs of frames
+        # with similar measured brightness map to the same nominal_luminance
+        peak = max(100.0, 50.0 * math.ceil(f.props["HDRMax"] / 50))
+
+        cached = tonemap_cache.get(peak)
+        if cached is not None:
+            return cached
 
         # Tonemap
         clip = core.resize.Spline36(
@@ -1094,6 +1036,8 @@ def DynamicTonemap(
 
         clip = core.resize.Spline36(clip, format=vs.RGB48)
 
+        tonemap_cache[peak] = clip
+
         return clip
 
     clip_orig_format = clip.format
@@ -1191,22 +1135,30 @@ def FillBorders(
         if isinstance(planes, int):
             planes = [planes]
 
-        y, u, v = split(clip)
-
-        if 0 in planes:
-            y = y.fb.FillBorders(left=left, right=right, top=top, bottom=bottom, mode=mode)
+        left_c, right_c = left, right
+        top_c, bottom_c = top, bottom
 
         if clip.format.subsampling_w == 1:
-            left, right = math.ceil(left / 2), math.ceil(right / 2)
+            left_c, right_c = math.ceil(left / 2), math.ceil(right / 2)
         if clip.format.subsampling_h == 1:
-            top, bottom = math.ceil(top / 2), math.ceil(bottom / 2)
-
-        if 1 in planes:
-            u = u.fb.FillBorders(left=left, right=right, top=top, bottom=bottom, mode=mode)
-        if 2 in planes:
-            v = v.fb.FillBorders(left=left, right=right, top=top, bottom=bottom, mode=mode)
-
-        return join([y, u, v])
+            top_c, bottom_c = math.ceil(top / 2), math.ceil(bottom / 2)
+
+        def per_plane(luma_value: int, chroma_value: int) -> List[int]:
+            # FillBorders takes per-plane arrays, so one call covers all planes
+            # without splitting and rejoining; 0 disables the fill for a plane
+            return [
+                luma_value if 0 in planes else 0,
+                chroma_value if 1 in planes else 0,
+                chroma_value if 2 in planes else 0,
+            ]
+
+        return clip.fb.FillBorders(
+            left=per_plane(left, left_c),
+            right=per_plane(right, right_c),
+            top=per_plane(top, top_c),
+            bottom=per_plane(bottom, bottom_c),
+            mode=mode,
+        )
 
     return clip.fb.FillBorders(left=left, right=right, top=top, bottom=bottom, mode=mode)
 
@@ -1250,15 +1202,15 @@ def FrameInfo(
     >>> FrameInfo(clip, title)
     """
 
+    # Plain int local so the callback doesn't query the node on every frame
+    num_frames = clip.num_frames
+
     def FrameProps(n: int, f: vs.VideoFrame, clip: vs.VideoNode, padding: Optional[str]) -> vs.VideoNode:
-        if "_PictType" in f.props:
-            pict_type = f.props["_PictType"]
-            if not isinstance(pict_type, str):
-                pict_type = str(pict_type, "utf-8")
+        pict_type = f.props.get("_PictType", "N/A")
+        if not isinstance(pict_type, str):
+            pict_type = str(pict_type, "utf-8")
 
-            info = f"Frame {n} of {clip.num_frames}\nPicture type: {pict_type}"
-        else:
-            info = f"Frame {n} of {clip.num_frames}\nPicture type: N/A"
+        info = f"Frame {n} of {num_frames}\nPicture type: {pict_type}"
 
         if pad_info and padding:
             info_text = [padding + info]
@@ -1303,51 +1255,51 @@ def InterleaveDir(
       * tonemap = True tonemaps each clip before applying FrameInfo
       * source_filter = Source filter to use for loading clips.  Defaults to ffms2.
     """
+    from concurrent.futures import ThreadPoolExecutor
     from pathlib import Path
 
+    if not isinstance(PrintInfo, bool):
+        raise TypeError("InterleaveDir: PrintInfo must be a boolean.")
+
+    if not isinstance(DelProp, bool):
+        raise TypeError("InterleaveDir: DelProp must be a boolean.")
+
+    if first is not None and not isinstance(repeat, bool):
+        raise TypeError("InterleaveDir: repeat must be a boolean.")
+
     if source_filter is None:
         source_filter = core.ffms2.Source
 
     folder_path = Path(folder)
-    files = sorted(folder_path.iterdir())
+    files = sorted(f for f in folder_path.iterdir() if f.is_file() and f.suffix == ".mkv")
 
-    if first is not None:
-        sources = [first]
-        j = 0
-    else:
-        sources = []
-        j = -1
+    sources: List[vs.VideoNode] = [] if first is None else [first]
 
-    for file in files:
-        filename = file.name
+    if not files:
+        return core.std.Interleave(sources)
 
-        if file.is_file() and ".mkv" == file.suffix:
-            j = j + 1
-            sources.append(0)
-            sources[j] = source_filter(folder + "/" + filename)
+    # Loading is mostly indexing cost and independent per file, so the source
+    # filter calls run in parallel; everything downstream stays in file order
+    with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+        loaded = list(executor.map(lambda f: source_filter(str(f)), files))
 
-            if first is not None:
-                sources[j] = core.std.AssumeFPS(clip=sources[j], src=first)
+    for file, src in zip(files, loaded):
+        if first is not None:
+            src = core.std.AssumeFPS(clip=src, src=first)
 
-            if tonemap:
-                sources[j] = DynamicTonemap(sources[j], libplacebo=False)
+        if tonemap:
+            src = DynamicTonemap(src, libplacebo=False)
 
-            if PrintInfo:
-                sources[j] = FrameInfo(clip=sources[j], title=filename)
-            elif PrintInfo is not False:
-                raise TypeError("InterleaveDir: PrintInfo must be a boolean.")
+        if PrintInfo:
+            src = FrameInfo(clip=src, title=file.name)
 
-            if DelProp is True:
-                sources[j] = core.std.RemoveFrameProps(sources[j], props=["_Primaries", "_Matrix", "_Transfer"])
-            elif DelProp is not False:
-                raise TypeError("InterleaveDir: DelProp must be a boolean.")
+        if DelProp:
+            src = core.std.RemoveFrameProps(src, props=["_Primaries", "_Matrix", "_Transfer"])
 
-            if first is not None and repeat:
-                j = j + 1
-                sources.append(0)
-                sources[j] = first
-            elif first is not None and repeat is not False:
-                raise TypeError("InterleaveDir: repeat must be a boolean.")
+        sources.append(src)
+
+        if first is not None and repeat:
+            sources.append(first)
 
     return core.std.Interleave(sources)
 
@@ -1363,19 +1315,13 @@ def ExtractFramesReader(clip: vs.VideoNode, csvfile: Union[str, PathLike]) -> vs
     """
     import csv
 
-    selec = core.std.BlankClip(clip=clip, length=1)
-
     with open(csvfile) as framescsv:
         csvzones = csv.reader(framescsv, delimiter=" ")
-        for row in csvzones:
-            start = row[0]
-            end = row[1]
-
-            selec = selec + core.std.Trim(clip, first=start, last=end)
-
-    selec = core.std.Trim(selec, first=1)
+        parts = [core.std.Trim(clip, first=int(row[0]), last=int(row[1])) for row in csvzones]
 
-    return selec
+    # One flat Splice instead of pairwise concatenation, which built a graph
+    # as deep as the CSV had rows (plus a BlankClip to trim off again)
+    return core.std.Splice(clips=parts)
 
 
 def fixlvls(
@@ -1415,7 +1361,9 @@ def fixlvls(
         planes = [0]
 
     o_depth = clip.format.bits_per_sample
-    clip = Depth(clip, 32)
+
+    if o_depth != 32:
+        clip = Depth(clip, 32)
 
     vals = [min_in.copy(), max_in.copy(), min_out.copy(), max_out.copy()]
 
@@ -1428,22 +1376,26 @@ def fixlvls(
     if isinstance(planes, int):
         planes = [planes]
 
-    chroma = planes.copy()
-    if 0 in planes:
-        clip = core.std.Levels(
-            clip, gamma=gamma, min_in=vals[0][0], max_in=vals[1][0], min_out=vals[2][0], max_out=vals[3][0], planes=0
-        )
-        chroma.remove(0)
-    if chroma:
-        clip = core.std.Levels(
-            clip,
-            gamma=gamma,
-            min_in=vals[0][1],
-            max_in=vals[1][1],
-            min_out=vals[2][1],
-            max_out=vals[3][1],
-            planes=chroma,
-        )
+    def levels_expr(c: int) -> str:
+        lo_in, hi_in = vals[0][c], vals[1][c]
+        lo_out, hi_out = vals[2][c], vals[3][c]
+
+        if gamma == 1:
+            return f"x {lo_in} - {(hi_out - lo_out) / (hi_in - lo_in)} * {lo_out} +"
+
+        return f"x {lo_in} - {1 / (hi_in - lo_in)} * 0 max {1 / gamma} pow {hi_out - lo_out} * {lo_out} +"
+
+    # One Expr pass applies the remap to every requested plane at once instead
+    # of separate luma and chroma Levels nodes
+    exprs = ["", "", ""]
+    for p in planes:
+        exprs[p] = levels_expr(1 if p else 0)
+
+    if any(exprs):
+        clip = core.std.Expr(clip, exprs[: clip.format.num_planes])
+
+    if o_depth == 32:
+        return clip
 
     return Depth(clip, o_depth)
 
@@ -1456,18 +1408,29 @@ def mt_lut(clip: vs.VideoNode, expr: str, planes: Optional[List[int]] = None) ->
     >>> # expr is an infix expression, not like avisynth's mt_lut which takes a postfix one
     >>> mt_lut(clip, expr, planes)
     """
-    from ast import literal_eval
+    import numpy as np
 
     if planes is None:
         planes = [0]
 
-    minimum = 16 * ((1 << clip.format.bits_per_sample) - 1) // 256
-    maximum = 235 * ((1 << clip.format.bits_per_sample) - 1) // 256
+    bits = clip.format.bits_per_sample
+    size = 1 << bits
+
+    minimum = 16 * (size - 1) // 256
+    maximum = 235 * (size - 1) // 256
+
+    # Evaluate the expression once as a numpy broadcast over every code value
+    # instead of one interpreter call per LUT entry
+    code = compile(expr, "<mt_lut>", "eval")
+    result = np.asarray(eval(code, {"x": np.arange(size)}))
 
-    def clampexpr() -> int:
-        return int(max(minimum, min(round(literal_eval(expr)), maximum)))
+    if result.ndim == 0:
+        # Constant expression
+        result = np.full(size, result)
 
-    return core.std.Lut(clip=clip, function=clampexpr, planes=planes)
+    lut = np.clip(np.rint(result), minimum, maximum).astype(int)
+
+    return core.std.Lut(clip=clip, lut=lut.tolist(), planes=planes)
 
 
 def UpscaleCheck(clip: vs.VideoNode, height: int = 720, kernel: str = "spline36", interleave: bool = True, **kwargs):
@@ -2059,6 +2022,25 @@ def add_hdr_measurement_props(
 
         return v
 
+    def histogram_percentile(pixels, percentile: float) -> float:
+        # O(N) bincount percentile for 16-bit integer planes, matching
+        # np.percentile's linear interpolation without sorting the plane
+        hist = np.bincount(pixels.ravel(), minlength=65536)
+        cum = np.cumsum(hist)
+
+        rank = (cum[-1] - 1) * (percentile / 100.0)
+        lo_rank = math.floor(rank)
+        hi_rank = math.ceil(rank)
+
+        lo = int(np.searchsorted(cum, lo_rank, side="right"))
+
+        if hi_rank == lo_rank:
+            return float(lo)
+
+        hi = int(np.searchsorted(cum, hi_rank, side="right"))
+
+        return lo + (rank - lo_rank) * (hi - lo)
+
     def pq_props(
         n: int,
         f: list[vs.VideoFrame],
@@ -2122,7 +2104,7 @@ def add_hdr_measurement_props(
                 if max_luminance:
                     max_value = np.percentile(luminance_pixels, percentile)
                 else:
-                    max_value = np.percentile(maxrgb_pixels, percentile)
+                    max_value = histogram_percentile(maxrgb_pixels, percentile)
 
                 fall_value = np.mean(maxrgb_pixels)
                 max_stdev_value = np.std(maxrgb_pixels)
@@ -2155,7 +2137,7 @@ def add_hdr_measurement_props(
                 y_pixels = np.asarray(prop_src[0])
 
                 min_value = np.min(y_pixels)
-                max_value = np.percentile(y_pixels, percentile)
+                max_value = histogram_percentile(y_pixels, percentile)
                 avg_value = np.mean(y_pixels)
 
             min_prop = min_value / 65535.0
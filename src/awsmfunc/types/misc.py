@@ -1,6 +1,11 @@
 import math
 from typing import NamedTuple, TypedDict
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 ST2084_PEAK_LUMINANCE = 10000
 ST2084_M1 = 2610.0 / 16384.0
 ST2084_M2 = (2523.0 / 4096.0) * 128.0
@@ -14,7 +19,7 @@ def st2084_eotf(x: float) -> float:
     if x > 0.0:
         xpow = math.pow(x, float(1.0) / ST2084_M2)
         num = max(xpow - ST2084_C1, float(0.0))
-        den = max(ST2084_C2 - ST2084_C3 * xpow, float("-inf"))
+        den = max(ST2084_C2 - ST2084_C3 * xpow, -math.inf)
         y = float(math.pow(num / den, float(1.0) / ST2084_M1))
 
     return y
@@ -28,6 +33,13 @@ def st2084_inverse_eotf(x: float) -> float:
     )
 
 
+if njit is not None:
+    # Compiled on first call and cached to disk, so the compile cost is paid
+    # once rather than per session; pure math fallback when numba is absent
+    st2084_eotf = njit(cache=True)(st2084_eotf)
+    st2084_inverse_eotf = njit(cache=True)(st2084_inverse_eotf)
+
+
 class DetectProgressState(TypedDict):
     start_time: float
     frames_done: int